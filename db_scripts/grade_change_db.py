@@ -1,37 +1,132 @@
 import os
 import sys
+import json
+import time
+import heapq
+import operator
 import requests
 import pandas as pd
 from datetime import datetime, timedelta, date
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 excel_path = "data/grades_updates.xlsx"
+csv_path = "data/grades_updates.csv"
 os.makedirs(os.path.dirname(excel_path), exist_ok=True)
 
+# Column layout of the grades CSV; GRADE_KEY identifies one analyst grade and keeps it free of duplicates
+GRADE_COLUMNS = ["symbol", "date", "gradingCompany", "previousGrade", "newGrade", "action"]
+GRADE_KEY = ["symbol", "date", "gradingCompany"]
+
+# Telegram rejects messages over 4096 characters; leave headroom for Markdown
+TELEGRAM_MAX_CHARS = 4000
+
+# Local JSON cache for responses that rarely change between re-runs
+CACHE_DIR = "data/cache"
+CACHE_TTL = 6 * 60 * 60  # seconds
+
 API_KEY = os.environ.get("FMP_API_KEY")
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
 CHAT_ID = os.environ.get("CHAT_ID")
-    
+
+# Shared keep-alive session so the per-symbol fan-out reuses pooled connections
+MAX_WORKERS = 16
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=32,
+                                      max_retries=Retry(total=3, backoff_factor=0.3)))
+
 def get_json(url, params=None):
     if params is None:
         params = {}
     params['apikey'] = API_KEY
-    r = requests.get(url, params=params)
+    r = SESSION.get(url, params=params, timeout=10)
     if r.status_code == 200:
         return r.json()
     else:
         print(f"Error {r.status_code} for URL {url}")
         return None
 
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+def _fast_date(s):
+    """Parse the leading YYYY-MM-DD of an FMP date string without strptime."""
+    return date(int(s[0:4]), int(s[5:7]), int(s[8:10]))
+
+def cached_json(key, fetch, ttl=CACHE_TTL):
+    """
+    Return the cached JSON for `key` if it is younger than `ttl` seconds,
+    otherwise call `fetch()` and cache a non-empty result.
+    """
+    path = os.path.join(CACHE_DIR, f"{key}.json")
+    if os.path.exists(path) and time.time() - os.path.getmtime(path) < ttl:
+        with open(path) as f:
+            return json.load(f)
+
+    data = fetch()
+    if data:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(data, f)
+    return data
+
 def fetch_sp500_symbols(top_n=100):
     url = "https://financialmodelingprep.com/api/v3/sp500_constituent"
-    data = get_json(url)
+    data = cached_json("sp500_constituent", lambda: get_json(url))
     if not data:
         return []
     return [item['symbol'] for item in data][:top_n]
 
-def get_upgraded_downgraded_symbols(symbols, api_key, debug=False, test_date=None):
-    base_url = "https://financialmodelingprep.com/stable/grades"
+GRADES_URL = "https://financialmodelingprep.com/stable/grades"
+
+def fetch_grades(symbol, api_key, use_cache=False):
+    """
+    Fetch the grade history for one symbol; returns the JSON list or None on error.
+    With use_cache=True a response from the last CACHE_TTL seconds is reused.
+    """
+    def _fetch():
+        try:
+            response = SESSION.get(GRADES_URL, params={"symbol": symbol, "apikey": api_key}, timeout=10)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            print(f"Error processing {symbol}: {e}")
+            return None
+
+    if use_cache:
+        return cached_json(f"grades_{symbol}", _fetch)
+    return _fetch()
+
+def fetch_latest_grades_bulk(symbols, oldest_date, limit=1000, max_pages=5):
+    """
+    Return {symbol: latest grade record} for `symbols` from the bulk grades feed,
+    paging until the feed reaches records older than `oldest_date`.
+    Returns None if the feed is unavailable so callers can fall back to per-symbol calls.
+    """
+    url = "https://financialmodelingprep.com/stable/grades-latest-news"
+    symbol_set = set(symbols)
+    oldest_iso = oldest_date.isoformat()
+    latest = {}
+
+    for page in range(max_pages):
+        data = get_json(url, params={"page": page, "limit": limit})
+        if not isinstance(data, list):
+            return None if page == 0 else latest
+        if not data:
+            break
+
+        # Feed is newest first, so the first hit per symbol is its latest grade
+        for record in data:
+            symbol = record.get("symbol")
+            if symbol in symbol_set and symbol not in latest:
+                latest[symbol] = record
+
+        if (data[-1].get("publishedDate") or "")[:10] < oldest_iso:
+            break
 
+    return latest
+
+def get_upgraded_downgraded_symbols(symbols, api_key, debug=False, test_date=None):
     today = datetime.today().date()
 
     if test_date:
@@ -50,28 +145,34 @@ def get_upgraded_downgraded_symbols(symbols, api_key, debug=False, test_date=Non
     if debug:
         print("Valid dates being checked:", valid_dates)
 
+    # FMP dates are ISO strings, so compare them as strings with O(1) lookups
+    valid_iso = frozenset(d.isoformat() for d in valid_dates)
+    valid_actions = frozenset(("upgrade", "downgrade"))
+
     result = []
 
+    # One bulk call covers the live window; backtests need each symbol's full history
+    latest_by_symbol = None if test_date else fetch_latest_grades_bulk(symbols, min(valid_dates))
+    if latest_by_symbol is None:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            responses = list(executor.map(lambda sym: fetch_grades(sym, api_key, use_cache=True), symbols))
+        latest_by_symbol = {sym: data[0] for sym, data in zip(symbols, responses) if data}
+
     for symbol in symbols:
         try:
-            url = f"{base_url}?symbol={symbol}&apikey={api_key}"
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-
-            if not data:
+            latest = latest_by_symbol.get(symbol)
+            if not latest:
                 if debug:
                     print(f"{symbol}: no data returned")
                 continue
 
-            latest = data[0]
-            grade_date = datetime.strptime(latest["date"], "%Y-%m-%d").date()
+            grade_date = (latest.get("date") or latest["publishedDate"])[:10]
             action = latest["action"].lower()
 
             if debug:
                 print(f"{symbol}: latest_date={grade_date}, action={action}")
 
-            if grade_date in valid_dates and action in ("upgrade", "downgrade"):
+            if grade_date in valid_iso and action in valid_actions:
                 result.append(symbol)
 
         except Exception as e:
@@ -97,41 +198,39 @@ def get_top_grade_changes(symbols, api_key, top_n=3, debug=False):
     Returns:
         pd.DataFrame: Combined DataFrame of all symbols with top N grade changes.
     """
-    base_url = "https://financialmodelingprep.com/stable/grades"
-    all_records = []
+    # Keyed like the CSV history so duplicates are dropped while collecting
+    records = {}
 
-    for symbol in symbols:
-        try:
-            url = f"{base_url}?symbol={symbol}&apikey={api_key}"
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        responses = list(executor.map(lambda sym: fetch_grades(sym, api_key), symbols))
 
-            if not data:
-                if debug:
-                    print(f"{symbol}: No data returned")
-                continue
-
-            # Take top N records
-            for record in data[:top_n]:
-                all_records.append(record)
-                if debug:
-                    print(record)
+    for symbol, data in zip(symbols, responses):
+        if not data:
+            if debug:
+                print(f"{symbol}: No data returned")
+            continue
 
-        except Exception as e:
-            print(f"Error processing {symbol}: {e}")
+        # Take top N records
+        for record in data[:top_n]:
+            key = (record.get("symbol"), record.get("date"), record.get("gradingCompany"))
+            records.setdefault(key, record)
+            if debug:
+                print(record)
 
     # Convert list of dictionaries to DataFrame
-    df = pd.DataFrame(all_records)
+    df = pd.DataFrame(list(records.values()))
     return df
 
 # -------------------------------
 # FUNCTION: Fetch price target trend
 # -------------------------------
+_by_published_date = operator.itemgetter("publishedDate")
+
 def fetch_price_target_trend(symbol):
-    url = f"https://financialmodelingprep.com/stable/price-target-news?symbol={symbol}&page=0&limit=10&apikey={API_KEY}"
+    url = "https://financialmodelingprep.com/stable/price-target-news"
+    params = {"symbol": symbol, "page": 0, "limit": 10, "apikey": API_KEY}
     try:
-        response = requests.get(url, timeout=10)
+        response = SESSION.get(url, params=params, timeout=10)
         if response.status_code != 200:
             print(f"Error fetching {symbol}: {response.status_code}")
             return None
@@ -139,10 +238,8 @@ def fetch_price_target_trend(symbol):
         if not data or len(data) < 2:
             return None
 
-        # Sort by date descending and take latest 2
-        data_sorted = sorted(data, key=lambda x: x["publishedDate"], reverse=True)[:2]
-        latest = data_sorted[0]
-        previous = data_sorted[1]
+        # Latest 2 by date, without sorting the whole list
+        latest, previous = heapq.nlargest(2, data, key=_by_published_date)
 
         latest_target = latest.get("priceTarget") or latest.get("adjPriceTarget")
         prev_target = previous.get("priceTarget") or previous.get("adjPriceTarget")
@@ -157,7 +254,7 @@ def fetch_price_target_trend(symbol):
             trend = "Unchanged"
 
         def clean_date(dt_str):
-            return datetime.fromisoformat(dt_str.replace("Z", "")).strftime("%Y-%m-%d")
+            return _fast_date(dt_str).isoformat()
 
         return {
             "Symbol": symbol,
@@ -177,9 +274,9 @@ def fetch_price_target_trend(symbol):
 
 def fmt_date(date_str):
     try:
-        dt = datetime.fromisoformat(date_str.replace("Z", ""))
-        return dt.strftime("%b %-d")  # 'Oct 3'
-    except:
+        d = _fast_date(date_str)
+        return f"{_MONTHS[d.month - 1]} {d.day}"  # 'Oct 3'
+    except (ValueError, TypeError):
         return date_str
 
 def trend_arrow(trend):
@@ -190,6 +287,60 @@ def trend_arrow(trend):
     else:
         return "→"
         
+def append_new_grades(df, csv_path):
+    """
+    Append grade rows that are not yet in the CSV history and return them.
+    Only the key columns of the history are read; existing rows are never rewritten.
+    """
+    df = df.reindex(columns=GRADE_COLUMNS)
+    exists = os.path.exists(csv_path)
+    seen = set()
+    if exists:
+        history = pd.read_csv(csv_path, usecols=GRADE_KEY, dtype=str)
+        seen.update(history.itertuples(index=False, name=None))
+
+    # One pass drops keys already in the history as well as repeats within df
+    keep = []
+    for key in zip(df["symbol"], df["date"], df["gradingCompany"]):
+        keep.append(key not in seen)
+        seen.add(key)
+    df_new = df[keep]
+    if not df_new.empty:
+        df_new.to_csv(csv_path, mode="a", header=not exists, index=False)
+    return df_new
+
+def write_sheet(df, sheet_name, excel_path):
+    """Replace a single sheet in the workbook, leaving the other sheets untouched."""
+    if os.path.exists(excel_path):
+        writer = pd.ExcelWriter(excel_path, engine="openpyxl", mode="a", if_sheet_exists="replace")
+    else:
+        writer = pd.ExcelWriter(excel_path, engine="openpyxl")
+    with writer:
+        df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+def export_grades_excel():
+    """Rebuild the "Grades Updates" sheet from the CSV history (on demand, not every run)."""
+    df_history = pd.read_csv(csv_path)
+    write_sheet(df_history, "Grades Updates", excel_path)
+    print(f"Exported {len(df_history)} grade rows to {excel_path}")
+
+def send_telegram_message(message):
+    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
+    payload = {"chat_id": CHAT_ID, "text": message, "parse_mode": "Markdown"}
+    response = SESSION.post(url, data=payload, timeout=10)
+    if response.status_code == 200:
+        print("Telegram message sent successfully!")
+    else:
+        print("Failed to send Telegram message:", response.text)
+
+def send_telegram_batch(messages):
+    """Send the messages as a single post when they fit, otherwise one post each."""
+    combined = "\n\n".join(messages)
+    if len(combined) <= TELEGRAM_MAX_CHARS:
+        messages = [combined]
+    for message in messages:
+        send_telegram_message(message)
+
 def send_updates(test_date=None):
     top_100_tickers = fetch_sp500_symbols(top_n=100)
     matched_symbols = get_upgraded_downgraded_symbols(top_100_tickers, API_KEY, debug=False, test_date=test_date)
@@ -203,87 +354,65 @@ def send_updates(test_date=None):
     # -----------------------------
     df_grades = get_top_grade_changes(matched_symbols, API_KEY, top_n=3, debug=False)
 
-    if os.path.exists(excel_path):
-        df_old = pd.read_excel(excel_path, sheet_name="Grades Updates")
-        df_combined = pd.concat([df_old, df_grades], ignore_index=True)
-
-        # Convert any list-valued cells to tuples so pandas can hash them for drop_duplicates
-        list_cols = df_combined.columns[df_combined.applymap(lambda x: isinstance(x, list)).any()].tolist()
-        for c in list_cols:
-            df_combined[c] = df_combined[c].apply(lambda x: tuple(x) if isinstance(x, list) else x)
-
-        df_combined.drop_duplicates(inplace=True)
-    else:
-        df_combined = df_grades
-        
-    # Save grades to Excel (first tab)
-    with pd.ExcelWriter(excel_path, engine="openpyxl") as writer:
-        df_combined.to_excel(writer, sheet_name="Grades Updates", index=False)
+    # Append-only history: only today's new rows are written
+    if not df_grades.empty:
+        df_new = append_new_grades(df_grades, csv_path)
+        print(f"Appended {len(df_new)} new grade rows to {csv_path}")
 
     # -----------------------------
-    # Send Grades Updates to Telegram
+    # Grades Updates message
     # -----------------------------
+    messages = []
     if not df_grades.empty:
         header = "`{:<6} {:<10} {:<12} {:<6}`".format("Symbol", "Date", "Company", "Action")
-        rows = [
-            "`{:<6} {:<10} {:<12} {:<6}`".format(r.symbol, r.date, r.gradingCompany[:12], r.action[:6])
-            for r in df_grades.itertuples(index=False)
-        ]
-        message_grades = "*Today's Stock Grading Updates:*\n\n" + "\n".join([header] + rows)
-
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-        payload = {"chat_id": CHAT_ID, "text": message_grades, "parse_mode": "Markdown"}
-        response = requests.post(url, data=payload)
-        if response.status_code == 200:
-            print("Grades message sent successfully!")
-        else:
-            print("Failed to send grades message:", response.text)
+        rows = (
+            "`" + df_grades["symbol"].map("{:<6}".format)
+            + " " + df_grades["date"].map("{:<10}".format)
+            + " " + df_grades["gradingCompany"].str.slice(0, 12).str.ljust(12)
+            + " " + df_grades["action"].str.slice(0, 6).str.ljust(6) + "`"
+        ).tolist()
+        messages.append("*Today's Stock Grading Updates:*\n\n" + "\n".join([header] + rows))
 
     # -----------------------------
     # Price Target Trend
     # -----------------------------
-    trend_records = []
-    for sym in matched_symbols:
-        trend = fetch_price_target_trend(sym)
-        if trend:
-            trend_records.append(trend)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        trend_records = [t for t in executor.map(fetch_price_target_trend, matched_symbols) if t]
 
     df_trends = pd.DataFrame(trend_records) if trend_records else pd.DataFrame()
 
-    # Save price trend in second tab
+    # Save today's price trend snapshot; grades history lives in the CSV
     if not df_trends.empty:
-        with pd.ExcelWriter(excel_path, engine="openpyxl", mode="a") as writer:
-            df_trends.to_excel(writer, sheet_name="Price Target Trend", index=False)
+        write_sheet(df_trends, "Price Target Trend", excel_path)
 
-        # Send Price Target Trend to Telegram
+    # Price Target Trend message
     header_trend = "`{:<6} {:<6} {:<8} {:<5} {:<5} {:<1}`".format(
         "Symbol", "N.Dt", "Firm", "N.Tgt", "O.Tgt", "T"
     )
 
     # Rows
-    rows_trend = [
-        "`{:<6} {:<6} {:<8} {:<5} {:<5} {:<1}`".format(
-            r.Symbol,
-            fmt_date(r.Latest_Date),
-            (r.Latest_Firm or "")[:8],  # truncate firm name
-            r.Latest_Target,
-            r.Previous_Target,
-            trend_arrow(r.Trend)
-        )
-        for r in df_trends.itertuples(index=False)
-    ]            
-    message_trend = "*Price Target Trend Summary:*\n\n" + "\n".join([header_trend] + rows_trend)
+    rows_trend = []
+    if not df_trends.empty:
+        rows_trend = (
+            "`" + df_trends["Symbol"].map("{:<6}".format)
+            + " " + df_trends["Latest_Date"].map(fmt_date).map("{:<6}".format)
+            + " " + df_trends["Latest_Firm"].fillna("").str.slice(0, 8).str.ljust(8)  # truncate firm name
+            + " " + df_trends["Latest_Target"].map("{:<5}".format)
+            + " " + df_trends["Previous_Target"].map("{:<5}".format)
+            + " " + df_trends["Trend"].map(trend_arrow) + "`"
+        ).tolist()
+    messages.append("*Price Target Trend Summary:*\n\n" + "\n".join([header_trend] + rows_trend))
 
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-    payload = {"chat_id": CHAT_ID, "text": message_trend, "parse_mode": "Markdown"}
-    response = requests.post(url, data=payload)
-    if response.status_code == 200:
-        print("Price trend message sent successfully!")
-    else:
-        print("Failed to send price trend message:", response.text)
+    # Grades and trend go out as one Telegram post when they fit
+    send_telegram_batch(messages)
 
 
 if __name__ == "__main__":
+    # Usage: grade_change_db.py [YYYY-MM-DD | --excel]
+    if len(sys.argv) > 1 and sys.argv[1] == "--excel":
+        export_grades_excel()
+        sys.exit(0)
+
     test_date = None
     if len(sys.argv) > 1:
         test_date = sys.argv[1]
@@ -1,8 +1,12 @@
+import os
 import requests
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from datetime import datetime, timedelta
-import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 API_KEY = os.environ.get("FMP_API_KEY")
 BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
@@ -19,13 +23,28 @@ SCAN_CONFIG = {
     "drawdown_max": -3,              # Max 3-day drawdown (percentage)
     "dma_window": 50,                # Moving average window for price trend filter
     "rsi_min": 25,                   # Minimum RSI to avoid oversold extremes
+    "rsi_period": 14,                # RSI lookback in days
     "max_5d_drop": -7,               # Max allowed 5-day drop before rejecting trade
     "max_10d_drop_for_regime": -7,   # Max 10-day drop to allow regime pass (soft stop)
     "hv_trend_threshold": 0,         # HV trend threshold to detect accelerating volatility
     "top_n": 3,                      # Number of top candidates to report
-    "min_history": 260               # Minimum historical data points required
+    "min_history": 260,              # Minimum historical data points required
+    "max_workers": 16                # Concurrent price-history fetches
 }
 
+# Pre-trade thresholds bound once so the per-symbol filter skips the dict lookups
+_DMA_WINDOW = SCAN_CONFIG["dma_window"]
+_RSI_MIN = SCAN_CONFIG["rsi_min"]
+_MAX_5D_DROP = SCAN_CONFIG["max_5d_drop"]
+_IV_FILTER_STRICT = SCAN_CONFIG["iv_filter_strict"]
+
+# Shared keep-alive session so the ticker fan-out reuses pooled connections;
+# throttling (429) and transient 5xx are retried here with backoff, honoring Retry-After
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=32,
+                                      max_retries=Retry(total=3, backoff_factor=0.3,
+                                                        status_forcelist=(429, 500, 502, 503, 504))))
+
 TICKER_UNIVERSE = [
     'NVDA', 'AAPL', 'GOOG', 'GOOGL', 'MSFT', 'AMZN', 'META', 'AVGO', 'TSLA', 'BRK-B',
     'LLY', 'WMT', 'JPM', 'V', 'ORCL', 'XOM', 'MA', 'JNJ', 'BAC', 'ABBV', 'NFLX',
@@ -48,10 +67,10 @@ def send_telegram_message(message: str):
     Sends a message string to the configured Telegram chat via bot.
     This allows real-time alerts of accepted signals directly on Telegram.
     """
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message, "parse_mode": "Markdown"}
+    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
+    payload = {"chat_id": CHAT_ID, "text": message, "parse_mode": "Markdown"}
     try:
-        response = requests.post(url, data=payload)
+        response = SESSION.post(url, data=payload, timeout=10)
         if not response.ok:
             print(f"Telegram send error: {response.text}")
     except Exception as e:
@@ -61,14 +80,23 @@ def send_telegram_message(message: str):
 # DATA FETCHING
 # =============================
 
+# Only these fields of the historical payload are used by the filters
+PRICE_COLS = ["date", "close"]
+
 def get_price_data(symbol, limit=300):
     """
     Fetches historical price data for the given symbol from FMP.
     Sufficient recent data is needed to calculate indicators and run filters.
     """
     print(f"\n📥 Fetching data: {symbol}")
-    url = f"https://financialmodelingprep.com/api/v3/historical-price-full/{symbol}?apikey={API_KEY}"
-    r = requests.get(url)
+    url = f"https://financialmodelingprep.com/api/v3/historical-price-full/{symbol}"
+    # timeseries trims the payload server-side to the rows we keep below
+    params = {"timeseries": limit, "apikey": API_KEY}
+    try:
+        r = SESSION.get(url, params=params, timeout=10)
+    except requests.RequestException as e:
+        print(f"❌ Request failed: {e}")
+        return None
 
     if r.status_code != 200:
         print("❌ API error")
@@ -79,8 +107,8 @@ def get_price_data(symbol, limit=300):
         print("❌ No historical data")
         return None
 
-    df = pd.DataFrame(data)
-    df["date"] = pd.to_datetime(df["date"])
+    df = pd.DataFrame.from_records(data, columns=PRICE_COLS)
+    df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d", cache=True)
     df = df.sort_values("date")
     return df.tail(limit)
 
@@ -88,41 +116,52 @@ def get_price_data(symbol, limit=300):
 # INDICATORS
 # =============================
 
+def _rolling_mean(values, window):
+    """Trailing rolling mean along the last axis, NaN-padded to the input length."""
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] >= window:
+        out[..., window - 1:] = sliding_window_view(values, window, axis=-1).mean(axis=-1)
+    return out
+
 def calculate_hv(close, window=20):
     """
     Calculates Historical Volatility (HV) based on log returns.
     HV is a proxy for implied volatility (IV) used in options pricing.
     Higher HV indicates more option premium opportunity.
+    Takes and returns float64 arrays (NaN until the window fills).
     """
-    returns = np.log(close / close.shift(1))
-    return returns.rolling(window).std() * np.sqrt(252)
+    out = np.full(len(close), np.nan)
+    returns = np.log(close[1:] / close[:-1])
+    if len(returns) >= window:
+        out[window:] = sliding_window_view(returns, window).std(axis=1, ddof=1) * np.sqrt(252)
+    return out
 
 def calculate_rsi(close, period=14):
     """
     Calculates the Relative Strength Index (RSI) to detect oversold/overbought conditions.
     We use it as a momentum filter to avoid entering during extreme selloffs.
+    Takes and returns float64 arrays (NaN until the period fills); a 2-D
+    (n_symbols, days) array is computed row-wise in one call.
     """
-    delta = close.diff()
-    gain = delta.clip(lower=0)
-    loss = -delta.clip(upper=0)
-
-    avg_gain = gain.rolling(period).mean()
-    avg_loss = loss.rolling(period).mean()
-
-    rs = avg_gain / avg_loss
-    return 100 - (100 / (1 + rs))
-
-def calculate_hv_percentile(df):
+    delta = np.diff(close)
+    avg_gain = _rolling_mean(np.clip(delta, 0, None), period)
+    avg_loss = _rolling_mean(-np.clip(delta, None, 0), period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    return np.concatenate((np.full(close.shape[:-1] + (1,), np.nan), rsi), axis=-1)
+
+def calculate_hv_percentile(close):
     """
     Calculates the percentile rank of the current HV compared to the past 252 trading days.
     Ensures current volatility is relatively high before selling options.
     """
-    hv = calculate_hv(df["close"]).dropna().tail(252)
+    hv = calculate_hv(close)
+    hv = hv[~np.isnan(hv)][-252:]
     if len(hv) < 100:
         return None
 
-    current = hv.iloc[-1]
-    percentile = (hv < current).mean() * 100
+    current = hv[-1]
+    percentile = np.count_nonzero(hv < current) / len(hv) * 100
     print(f"IV (HV) Percentile: {percentile:.1f}")
     return percentile
 
@@ -130,24 +169,21 @@ def calculate_hv_percentile(df):
 # CORE FILTERS
 # =============================
 
-def check_three_day_decline(df):
+def check_three_day_decline(close):
     """
     Checks if the last 3 days show a consistent decline.
     A sustained pullback increases chance of collecting premium on puts.
     """
-    closes = df["close"].values
-    decline = closes[-1] < closes[-2] < closes[-3]
-    print(f"3-day closes: {closes[-3:]} → Decline={decline}")
+    decline = close[-1] < close[-2] < close[-3]
+    print(f"3-day closes: {close[-3:]} → Decline={decline}")
     return decline
 
-def check_drawdown(df):
+def check_drawdown(close):
     """
     Calculates the 3-day drawdown percentage and checks if it is within configured bounds.
     Ensures the pullback is meaningful but not too severe.
     """
-    c0 = df["close"].iloc[-1]
-    c3 = df["close"].iloc[-4]
-    dd = (c0 / c3 - 1) * 100
+    dd = (close[-1] / close[-4] - 1) * 100
     print(f"3-day drawdown: {dd:.2f}%")
 
     valid = SCAN_CONFIG["drawdown_min"] <= dd <= SCAN_CONFIG["drawdown_max"]
@@ -157,18 +193,16 @@ def check_drawdown(df):
 # REGIME FILTER (SOFT STOP)
 # =============================
 
-def regime_filter(df):
+def regime_filter(close):
     """
     Soft filter to reject signals during accelerating selloffs indicated by
     large 10-day drops with increasing volatility.
     Helps avoid getting trapped in worsening market conditions.
     """
-    close = df["close"]
-
-    ret_10d = (close.iloc[-1] / close.iloc[-11] - 1) * 100
+    ret_10d = (close[-1] / close[-11] - 1) * 100
     hv = calculate_hv(close)
 
-    hv_trend = hv.iloc[-5:].mean() - hv.iloc[-15:-5].mean()
+    hv_trend = hv[-5:].mean() - hv[-15:-5].mean()
 
     print(f"10d return={ret_10d:.2f}%, HV trend={hv_trend:.4f}")
 
@@ -181,7 +215,7 @@ def regime_filter(df):
 # HARD PRE-TRADE FILTER
 # =============================
 
-def pre_trade_filter(df, iv_percentile):
+def pre_trade_filter(close, iv_percentile, rsi):
     """
     Hard stop filters just before trade execution including:
     - Price above moving average to confirm trend support
@@ -189,21 +223,21 @@ def pre_trade_filter(df, iv_percentile):
     - Recent 5-day return not too negative
     - Sufficiently high implied volatility percentile
     """
-    close = df["close"].iloc[-1]
+    last = close[-1]
 
-    dma = df["close"].rolling(SCAN_CONFIG["dma_window"]).mean().iloc[-1]
-    if close < dma:
-        return False, f"Below {SCAN_CONFIG['dma_window']} DMA"
+    # Only today's DMA is needed; today's RSI comes precomputed from the batched scan
+    dma = close[-_DMA_WINDOW:].mean()
+    if last < dma:
+        return False, f"Below {_DMA_WINDOW} DMA"
 
-    rsi = calculate_rsi(df["close"]).iloc[-1]
-    if rsi < SCAN_CONFIG["rsi_min"]:
+    if rsi < _RSI_MIN:
         return False, f"RSI too low ({rsi:.1f})"
 
-    ret_5d = (df["close"].iloc[-1] / df["close"].iloc[-6] - 1) * 100
-    if ret_5d < SCAN_CONFIG["max_5d_drop"]:
+    ret_5d = (last / close[-6] - 1) * 100
+    if ret_5d < _MAX_5D_DROP:
         return False, f"5d drop too large ({ret_5d:.1f}%)"
 
-    if iv_percentile < SCAN_CONFIG["iv_filter_strict"]:
+    if iv_percentile < _IV_FILTER_STRICT:
         return False, f"IV too low ({iv_percentile:.0f})"
 
     return True, "PASS"
@@ -226,32 +260,46 @@ def run_daily_scan():
     signals_pass_all = []
     signals_except_iv_strict = []
 
-    for symbol in TICKER_UNIVERSE:
-        df = get_price_data(symbol)
+    # Fetch all price histories concurrently; filtering below stays sequential
+    with ThreadPoolExecutor(max_workers=SCAN_CONFIG["max_workers"]) as executor:
+        price_data = dict(zip(TICKER_UNIVERSE, executor.map(get_price_data, TICKER_UNIVERSE)))
+
+    # Every filter works on one float64 close array per symbol with enough history
+    closes = {
+        symbol: df["close"].to_numpy(dtype=np.float64)
+        for symbol, df in price_data.items()
+        if df is not None and len(df) >= SCAN_CONFIG["min_history"]
+    }
 
-        if df is None or len(df) < SCAN_CONFIG["min_history"]:
+    # Today's RSI for all symbols at once: only the last period+1 closes feed it
+    period = SCAN_CONFIG["rsi_period"]
+    rsi_today = {}
+    if closes:
+        recent = np.stack([close[-(period + 1):] for close in closes.values()])
+        rsi_today = dict(zip(closes, calculate_rsi(recent, period)[:, -1]))
+
+    for symbol in TICKER_UNIVERSE:
+        if symbol not in closes:
             continue
+        close = closes[symbol]
 
-        if not check_three_day_decline(df):
+        if not check_three_day_decline(close):
             continue
 
-        valid_dd, drawdown = check_drawdown(df)
+        valid_dd, drawdown = check_drawdown(close)
         if not valid_dd:
             continue
 
-        ivp = calculate_hv_percentile(df)
+        ivp = calculate_hv_percentile(close)
         if ivp is None or ivp < SCAN_CONFIG["min_iv_percentile"]:
             continue
 
-        ok, reason = regime_filter(df)
+        ok, reason = regime_filter(close)
         if not ok:
             continue
 
         # Run all filters except strict IV filter first
-        ok_pre_trade, reason_pre_trade = pre_trade_filter(df, ivp)
-
-        # Inside loop over symbols:
-        ok_pre_trade, reason_pre_trade = pre_trade_filter(df, ivp)
+        ok_pre_trade, reason_pre_trade = pre_trade_filter(close, ivp, rsi_today[symbol])
 
         if not ok_pre_trade and "IV too low" in reason_pre_trade:
             signals_except_iv_strict.append({
@@ -273,8 +321,6 @@ def run_daily_scan():
             "score": score_signal(drawdown, ivp)
         })
 
-        time.sleep(0.6)
-
     # Sort signals
     signals_pass_all = sorted(signals_pass_all, key=lambda x: x["score"], reverse=True)
     signals_except_iv_strict = sorted(signals_except_iv_strict, key=lambda x: x["score"], reverse=True)
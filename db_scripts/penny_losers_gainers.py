@@ -1,9 +1,16 @@
 import os
 import time
 import math
+import json
+import functools
+import threading
 import requests
+import openpyxl
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 excel_path = "data/grades_updates.xlsx"
 os.makedirs(os.path.dirname(excel_path), exist_ok=True)
@@ -14,23 +21,75 @@ CHAT_ID = os.environ.get("CHAT_ID")
 
 # Retry / rate-limit handling configuration
 MAX_RETRIES = 6
-INITIAL_BACKOFF = 1      # seconds
-BACKOFF_FACTOR = 2       # exponential factor
-PER_REQUEST_PAUSE = 0.5  # pause between requests to avoid bursting
+INITIAL_BACKOFF = 1        # seconds
+BACKOFF_FACTOR = 2         # exponential factor
+MAX_WORKERS = 8            # concurrent historical fetches
+REQUESTS_PER_MINUTE = 300  # FMP quota shared by all worker threads
+BATCH_SIZE = 5             # FMP caps multi-symbol historical requests at 5 tickers
+HIST_CACHE_DIR = "data/cache/hist"  # raw daily bars cached per (symbol, as-of date)
+BAR_FIELDS = ("date", "close", "volume")  # only fields of a bar the scan reads
+
+# Breakout scoring: days of history scored and the label of each criterion, in score_stocks column order
+SCORE_WINDOW = 20
+UP_CRITERIA = [
+    "Price above MA5 & MA10",
+    "Recent price surge >5%",
+    "Previous day surge >3%",
+    "Near 20-day high breakout",
+    "Volume surge >1.5 * 5-day avg",
+]
+DOWN_CRITERIA = [
+    "Price below MA5 & MA10",
+    "Recent price drop >5%",
+    "Previous day drop >3%",
+    "Near 20-day low breakout",
+    "Volume surge >1.5 * 5-day avg",
+]
+
+# One keep-alive session for every request, sized for the worker pool
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS))
+
+
+class RateLimiter:
+    """Spaces calls at least `interval` seconds apart across all threads."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        """Hold every thread's next slot back by at least `seconds`, e.g. after a 429."""
+        with self.lock:
+            self.next_slot = max(self.next_slot, time.monotonic() + seconds)
+
+
+RATE_LIMITER = RateLimiter(60 / REQUESTS_PER_MINUTE)
 
 
 def request_with_retries(url, timeout=30, allowed_statuses=(200,)):
     """
     Perform GET with retries, honoring Retry-After header when status 429 is returned.
+    Every attempt waits for the shared rate limiter so worker threads stay under the FMP quota;
+    a 429 pauses the limiter, so all workers back off together rather than only the one that was throttled.
     Returns requests.Response on success (status in allowed_statuses) or None on permanent failure.
     """
-    session = requests.Session()
     attempt = 0
     backoff = INITIAL_BACKOFF
 
     while attempt < MAX_RETRIES:
+        RATE_LIMITER.wait()
         try:
-            r = session.get(url, timeout=timeout)
+            r = SESSION.get(url, timeout=timeout)
         except requests.RequestException as e:
             # network error -> retry
             attempt += 1
@@ -54,8 +113,8 @@ def request_with_retries(url, timeout=30, allowed_statuses=(200,)):
 
             # Prefer server-provided header, otherwise exponential backoff
             sleep_time = retry_after if retry_after is not None else backoff
-            print(f"Rate limited (429) for URL {url}. Sleeping {sleep_time}s before retry (attempt {attempt+1}/{MAX_RETRIES})")
-            time.sleep(sleep_time)
+            print(f"Rate limited (429) for URL {url}. Pausing all requests {sleep_time}s before retry (attempt {attempt+1}/{MAX_RETRIES})")
+            RATE_LIMITER.pause(sleep_time)
             attempt += 1
             backoff *= BACKOFF_FACTOR
             continue
@@ -77,6 +136,31 @@ def request_with_retries(url, timeout=30, allowed_statuses=(200,)):
     return None
 
 
+def disk_cache(ttl_hours=24, path="data/cache/{name}.json"):
+    """
+    Cache a no-argument function's JSON-serializable result on disk for `ttl_hours`.
+    Empty results are not cached so a failed fetch is retried on the next call.
+    """
+    def decorator(func):
+        cache_path = path.format(name=func.__name__)
+
+        @functools.wraps(func)
+        def wrapper():
+            if os.path.exists(cache_path) and time.time() - os.path.getmtime(cache_path) < ttl_hours * 3600:
+                with open(cache_path) as f:
+                    return json.load(f)
+            result = func()
+            if result:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                with open(cache_path, "w") as f:
+                    json.dump(result, f)
+            return result
+        return wrapper
+    return decorator
+
+
+@functools.lru_cache(maxsize=1)
+@disk_cache(ttl_hours=24)
 def get_sp500_symbols():
     """Fetch all SP500 symbols"""
     url = f"https://financialmodelingprep.com/api/v3/sp500_constituent?apikey={API_KEY}"
@@ -94,8 +178,8 @@ def get_sp500_symbols():
     return [item['symbol'] for item in data if isinstance(item, dict) and 'symbol' in item]
 
 
-def get_historical(symbol, limit=20, test_date=None):
-    """Fetch last `limit` days historical prices with volume"""
+def fetch_bars(symbol):
+    """Fetch the raw newest-first daily bars for one symbol, or None on failure"""
     url = f"https://financialmodelingprep.com/stable/historical-price-eod/full?symbol={symbol}&apikey={API_KEY}"
     r = request_with_retries(url)
     if r is None:
@@ -115,206 +199,270 @@ def get_historical(symbol, limit=20, test_date=None):
     if not isinstance(data, list):
         print(f"Unexpected historical data format for {symbol}: {data}")
         return None
+    return data
+
+
+def get_historical(symbol, limit=20, test_date=None):
+    """Fetch last `limit` days historical prices with volume as (dates, closes, volumes) arrays"""
+    return history_to_arrays(fetch_bars(symbol), limit=limit, test_date=test_date)
+
+
+def history_to_arrays(data, limit=20, test_date=None):
+    """
+    Turn a newest-first list of daily bars into oldest-first (dates, closes, volumes) arrays
+    of the last `limit` days. Volumes are NaN where the feed has none. Returns None if no bars remain.
+    """
     if not data:
         return None
 
-    df = pd.DataFrame(data[:limit])
-    if df.empty:
+    bars = data[:limit][::-1]  # oldest → newest
+    dates = np.array([bar['date'][:10] for bar in bars], dtype='datetime64[D]')
+    closes = np.array([bar['close'] for bar in bars], dtype=np.float64)
+    volumes = np.array([bar.get('volume', np.nan) for bar in bars], dtype=np.float64)
+
+    if test_date:
+        keep = dates <= np.datetime64(pd.Timestamp(test_date).date())
+        dates, closes, volumes = dates[keep], closes[keep], volumes[keep]
+
+    if len(closes) == 0:
         return None
+    return dates, closes, volumes
 
-    df['date'] = pd.to_datetime(df['date'])
-    df = df[::-1]  # oldest → newest
 
-    if test_date:
-        test_dt = pd.to_datetime(test_date)
-        df = df[df['date'] <= test_dt]
-
-    return df
-
-
-def score_stock(df):
-    """Compute score based on breakout and volume criteria and return breakdown"""
-    if df is None or len(df) < 10:
-        return 0, "", [], []
-
-    df['ma5'] = df['close'].rolling(5).mean()
-    df['ma10'] = df['close'].rolling(10).mean()
-    df['pct_change'] = df['close'].pct_change() * 100
-    score = 0
-    breakdown = []
-
-    # 1️⃣ Price above MA5 and MA10
-    if df['close'].iloc[-1] > df['ma5'].iloc[-1] and df['close'].iloc[-1] > df['ma10'].iloc[-1]:
-        score += 1
-        breakdown.append("Price above MA5 & MA10")
-
-    # 2️⃣ Recent price surge (>5%)
-    if df['pct_change'].iloc[-1] > 5:
-        score += 1
-        breakdown.append("Recent price surge >5%")
-
-    # 3️⃣ Previous day price surge (>3%)
-    if df['pct_change'].iloc[-2] > 3:
-        score += 1
-        breakdown.append("Previous day surge >3%")
-
-    # 4️⃣ Near 20-day high breakout
-    high_20 = df['close'].rolling(20).max().iloc[-1]
-    if df['close'].iloc[-1] >= 0.95 * high_20:
-        score += 1
-        breakdown.append("Near 20-day high breakout")
-
-    # 5️⃣ Volume surge
-    last_5_volume = []
-    if 'volume' in df.columns:
-        df['vol_ma5'] = df['volume'].rolling(5).mean()
-        last_5_volume = df['volume'].iloc[-5:].tolist()
-        if df['volume'].iloc[-1] > 1.5 * df['vol_ma5'].iloc[-1]:
-            score += 1
-            breakdown.append("Volume surge >1.5 * 5-day avg")
-
-    # Last 5 closes and volumes
-    last_5 = df.iloc[-5:]
-    last_5_close = [f"{d.strftime('%Y-%m-%d')}: {c}" for d, c in zip(last_5['date'], last_5['close'])]
-    last_5_volume = [f"{d.strftime('%Y-%m-%d')}: {int(v):,}" for d, v in zip(last_5['date'], last_5['volume'])]
-
-    return score, "; ".join(breakdown), last_5_close, last_5_volume
-
-def score_stock_down(df):
-    """Compute score for downward breakout stocks"""
-    if df is None or len(df) < 10:
-        return 0, "", [], []
-
-    df['ma5'] = df['close'].rolling(5).mean()
-    df['ma10'] = df['close'].rolling(10).mean()
-    df['pct_change'] = df['close'].pct_change() * 100
-    score = 0
-    breakdown = []
-
-    # 1️⃣ Price below MA5 and MA10
-    if df['close'].iloc[-1] < df['ma5'].iloc[-1] and df['close'].iloc[-1] < df['ma10'].iloc[-1]:
-        score += 1
-        breakdown.append("Price below MA5 & MA10")
-
-    # 2️⃣ Recent price drop (>5%)
-    if df['pct_change'].iloc[-1] < -5:
-        score += 1
-        breakdown.append("Recent price drop >5%")
-
-    # 3️⃣ Previous day drop (>3%)
-    if df['pct_change'].iloc[-2] < -3:
-        score += 1
-        breakdown.append("Previous day drop >3%")
-
-    # 4️⃣ Near 20-day low breakout
-    low_20 = df['close'].rolling(20).min().iloc[-1]
-    if df['close'].iloc[-1] <= 1.05 * low_20:  # within 5% of 20-day low
-        score += 1
-        breakdown.append("Near 20-day low breakout")
-
-    # 5️⃣ Volume surge (optional)
-    last_5_volume = []
-    if 'volume' in df.columns:
-        df['vol_ma5'] = df['volume'].rolling(5).mean()
-        last_5_volume = df['volume'].iloc[-5:].tolist()
-        if df['volume'].iloc[-1] > 1.5 * df['vol_ma5'].iloc[-1]:
-            score += 1
-            breakdown.append("Volume surge >1.5 * 5-day avg")
-
-    # Last 5 closes and volumes
-    last_5 = df.iloc[-5:]
-    last_5_close = [f"{d.strftime('%Y-%m-%d')}: {c}" for d, c in zip(last_5['date'], last_5['close'])]
-    last_5_volume = [f"{d.strftime('%Y-%m-%d')}: {int(v):,}" for d, v in zip(last_5['date'], last_5['volume'])]
-
-    return score, "; ".join(breakdown), last_5_close, last_5_volume
-
-
-# --- Function to pick downward S&P500 stocks ---
-def pick_sp500_stocks_down(test_date=None):
-    sp500_symbols = get_sp500_symbols()
-    results = []
-    for sym in sp500_symbols:
-        df = get_historical(sym, test_date=test_date)
-        # pause briefly to avoid hitting burst limit
-        time.sleep(PER_REQUEST_PAUSE)
-        sc, breakdown, last_5_close, last_5_volume = score_stock_down(df)
-        if sc > 1:  # strong candidates
-            results.append({
-                "symbol": sym,
-                "score": sc,
-                "breakdown": breakdown,
-                "last_5_close": last_5_close,
-                "last_5_volume": last_5_volume
-            })
-    results.sort(key=lambda x: x['score'], reverse=True)
-    return results[:TOP_N]
-
-
-def pick_sp500_stocks_up(test_date=None):
+def fetch_bars_chunk(symbols, limit=20):
+    """
+    Fetch up to BATCH_SIZE symbols in one request and return {symbol: bars or None}.
+    Falls back to one fetch_bars call per symbol if the batch response is unusable.
+    """
+    url = (f"https://financialmodelingprep.com/api/v3/historical-price-full/{','.join(symbols)}"
+           f"?timeseries={limit}&apikey={API_KEY}")
+    r = request_with_retries(url)
+    data = None
+    if r is not None and r.status_code == 200:
+        try:
+            data = r.json()
+        except Exception as e:
+            print(f"Error decoding JSON for batch {symbols}: {e}")
+
+    # Multi-symbol responses wrap each history; a single symbol comes back unwrapped
+    if isinstance(data, dict) and 'historicalStockList' in data:
+        entries = data['historicalStockList']
+    elif isinstance(data, dict) and 'historical' in data:
+        entries = [data]
+    else:
+        print(f"Batch fetch failed for {symbols}; falling back to per-symbol requests")
+        return {sym: fetch_bars(sym) for sym in symbols}
+
+    bars = dict.fromkeys(symbols)
+    for entry in entries:
+        if isinstance(entry, dict) and entry.get('symbol') in bars:
+            bars[entry['symbol']] = entry.get('historical')
+    return bars
+
+
+def bars_cache_path(symbol, as_of):
+    return os.path.join(HIST_CACHE_DIR, f"{symbol}_{as_of}.json")
+
+
+def load_cached_bars(symbol, as_of):
+    """Return bars cached today for (symbol, as_of), or None"""
+    path = bars_cache_path(symbol, as_of)
+    if not os.path.exists(path) or date.fromtimestamp(os.path.getmtime(path)) != date.today():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_cached_bars(symbol, as_of, bars):
+    """Cache only BAR_FIELDS of each bar, compactly, so cache hits decode a fraction of the payload"""
+    bars = [{k: bar[k] for k in BAR_FIELDS if k in bar} for bar in bars]
+    os.makedirs(HIST_CACHE_DIR, exist_ok=True)
+    with open(bars_cache_path(symbol, as_of), "w") as f:
+        json.dump(bars, f, separators=(",", ":"))
+
+
+def get_historical_batch(symbols, limit=20, test_date=None):
+    """
+    Fetch histories for all symbols and return {symbol: (dates, closes, volumes) or None}.
+    Bars already cached today for (symbol, test_date or today) are read from disk;
+    the rest are fetched in BATCH_SIZE chunks, concurrently, and cached.
+    """
+    as_of = test_date or date.today().isoformat()
+    bars = {sym: load_cached_bars(sym, as_of) for sym in symbols}
+    missing = [sym for sym in symbols if bars[sym] is None]
+
+    chunks = [missing[i:i + BATCH_SIZE] for i in range(0, len(missing), BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for result in executor.map(lambda chunk: fetch_bars_chunk(chunk, limit=limit), chunks):
+            for sym, sym_bars in result.items():
+                if sym_bars:
+                    save_cached_bars(sym, as_of, sym_bars)
+            bars.update(result)
+
+    return {sym: history_to_arrays(bars[sym], limit=limit, test_date=test_date) for sym in symbols}
+
+
+def stack_histories(histories):
+    """
+    Stack the last SCORE_WINDOW closes and volumes of each history into (n_symbols, SCORE_WINDOW)
+    arrays, right-aligned and NaN-padded on the left. Also returns each history's length (0 if missing).
+    """
+    closes = np.full((len(histories), SCORE_WINDOW), np.nan)
+    volumes = np.full((len(histories), SCORE_WINDOW), np.nan)
+    lengths = np.zeros(len(histories), dtype=int)
+    for i, history in enumerate(histories):
+        if history is None:
+            continue
+        _, close, volume = history
+        close, volume = close[-SCORE_WINDOW:], volume[-SCORE_WINDOW:]
+        closes[i, SCORE_WINDOW - len(close):] = close
+        volumes[i, SCORE_WINDOW - len(volume):] = volume
+        lengths[i] = len(history[1])
+    return closes, volumes, lengths
+
+
+def score_stocks(stacked, direction="up"):
+    """
+    Score breakout (direction="up") or breakdown ("down") criteria for all stacked histories at once.
+    `stacked` is the (closes, volumes, lengths) tuple from stack_histories.
+    Returns (scores, hits) where hits[i, k] tells whether criterion k of UP_CRITERIA / DOWN_CRITERIA
+    fired for row i. Histories shorter than 10 days score 0.
+    """
+    closes, volumes, lengths = stacked
+    last = closes[:, -1]
+    ma5 = closes[:, -5:].mean(axis=1)
+    ma10 = closes[:, -10:].mean(axis=1)
+    full_window = lengths >= SCORE_WINDOW  # 20-day high/low needs a full window
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct_last = (closes[:, -1] / closes[:, -2] - 1) * 100
+        pct_prev = (closes[:, -2] / closes[:, -3] - 1) * 100
+        volume_surge = volumes[:, -1] > 1.5 * volumes[:, -5:].mean(axis=1)
+
+        if direction == "up":
+            hits = np.column_stack([
+                (last > ma5) & (last > ma10),
+                pct_last > 5,
+                pct_prev > 3,
+                full_window & (last >= 0.95 * closes.max(axis=1)),
+                volume_surge,
+            ])
+        else:
+            hits = np.column_stack([
+                (last < ma5) & (last < ma10),
+                pct_last < -5,
+                pct_prev < -3,
+                full_window & (last <= 1.05 * closes.min(axis=1)),  # within 5% of 20-day low
+                volume_surge,
+            ])
+
+    hits &= (lengths >= 10)[:, None]
+    return hits.sum(axis=1), hits
+
+
+def rank_candidates(symbols, ordered, stacked, direction="up"):
+    """
+    Score all symbols, keep strong candidates (score > 1) and return the TOP_N best as a DataFrame.
+    `ordered` holds each symbol's history and `stacked` is stack_histories(ordered).
+    Last 5 closes/volumes are "; "-joined strings so every column is hashable.
+    """
+    scores, hits = score_stocks(stacked, direction)
+    labels = UP_CRITERIA if direction == "up" else DOWN_CRITERIA
+
+    # Highest score first, ties in symbol order; only the TOP_N rows get formatted
+    strong = np.flatnonzero(scores > 1)
+    top = strong[np.argsort(-scores[strong], kind="stable")][:TOP_N]
+
+    syms, top_scores, breakdowns, last_5_close, last_5_volume = [], [], [], [], []
+    for i in top:
+        dates, closes, volumes = (arr[-5:] for arr in ordered[i])
+        syms.append(symbols[i])
+        top_scores.append(int(scores[i]))
+        breakdowns.append("; ".join(label for label, hit in zip(labels, hits[i]) if hit))
+        last_5_close.append("; ".join(f"{d}: {c}" for d, c in zip(dates, closes)))
+        last_5_volume.append("; ".join(f"{d}: {int(v):,}" for d, v in zip(dates, volumes)))
+
+    return pd.DataFrame({
+        "symbol": syms,
+        "score": top_scores,
+        "breakdown": breakdowns,
+        "last_5_close": last_5_close,
+        "last_5_volume": last_5_volume,
+    })
+
+
+# --- Pick upward and downward S&P500 stocks from one fetch ---
+def scan_sp500(test_date=None):
+    """Fetch every S&P500 history once and return (up_results, down_results) DataFrames"""
     sp500_symbols = get_sp500_symbols()
-    results = []
-    for sym in sp500_symbols:
-        df = get_historical(sym, test_date=test_date)
-        # pause briefly to avoid hitting burst limit
-        time.sleep(PER_REQUEST_PAUSE)
-        sc, breakdown, last_5_close, last_5_volume = score_stock(df)
-        if sc > 1:
-            results.append({
-                "symbol": sym,
-                "score": sc,
-                "breakdown": breakdown,
-                "last_5_close": last_5_close,
-                "last_5_volume": last_5_volume
-            })
-    results.sort(key=lambda x: x['score'], reverse=True)
-    return results[:TOP_N]
-
-
-def append_df_to_excel(df, sheet_name, excel_path):
+    histories = get_historical_batch(sp500_symbols, test_date=test_date)
+    ordered = [histories.get(sym) for sym in sp500_symbols]
+    stacked = stack_histories(ordered)  # shared by both directions
+    return (rank_candidates(sp500_symbols, ordered, stacked, direction="up"),
+            rank_candidates(sp500_symbols, ordered, stacked, direction="down"))
+
+
+def excel_value(value):
+    """Cell value as pandas' to_excel would write it: NaN as an empty cell."""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def append_frames_to_excel(frames, excel_path):
     """
-    Append a DataFrame to a sheet in an Excel file.
-    If the sheet/file doesn't exist, it creates them.
+    Append each {sheet_name: DataFrame} to its sheet in an Excel file with one load and one save.
+    Rows whose symbol is already on the sheet are skipped, so only new rows are written.
+    If a sheet/the file doesn't exist, it creates them.
     """
     if os.path.exists(excel_path):
-        # Read existing sheet if it exists
-        try:
-            existing_df = pd.read_excel(excel_path, sheet_name=sheet_name, engine="openpyxl")
-            df_combined = pd.concat([existing_df, df], ignore_index=True)
-            df_combined.drop_duplicates(subset=["symbol"], inplace=True)
-        except ValueError:
-            # Sheet doesn't exist yet
-            df_combined = df
+        wb = openpyxl.load_workbook(excel_path)
     else:
-        df_combined = df
+        wb = openpyxl.Workbook()
+        wb.remove(wb.active)
+
+    for sheet_name, df in frames.items():
+        if sheet_name in wb.sheetnames:
+            ws = wb[sheet_name]
+            header = [cell.value for cell in ws[1]]
+        else:
+            ws = wb.create_sheet(sheet_name)
+            header = list(df.columns)
+            ws.append(header)
+
+        symbol_col = header.index("symbol")
+        seen = {row[symbol_col] for row in ws.iter_rows(min_row=2, values_only=True)}
+        for row in df.reindex(columns=header).itertuples(index=False, name=None):
+            if row[symbol_col] in seen:
+                continue
+            seen.add(row[symbol_col])
+            ws.append([excel_value(v) for v in row])
+
+    wb.save(excel_path)
 
-    # Write back to Excel
-    with pd.ExcelWriter(excel_path,engine="openpyxl",mode="a",if_sheet_exists="replace") as writer:
-        df_combined.to_excel(writer, sheet_name=sheet_name, index=False)
-      
 
 if __name__ == "__main__":
     #test_date = "2025-09-28"  # Change for backtesting
     test_date = None
 
-    # Top SP500 Stocks
-    sp500_symbols = get_sp500_symbols()
-    top_sp500 = pick_sp500_stocks_up(test_date=test_date)
-    df_sp500 = pd.DataFrame(top_sp500) if top_sp500 else pd.DataFrame()
+    # Top and Bottom SP500 Stocks
+    df_sp500, df_sp500_down = scan_sp500(test_date=test_date)
     if not df_sp500.empty:
         print(f"\nTop S&P500 Stock Picks as of {test_date}:")
         pd.set_option('display.max_colwidth', None)
         print(df_sp500) 
 
 
-    bottom_sp500 = pick_sp500_stocks_down(test_date=test_date)
-    df_sp500_down = pd.DataFrame(bottom_sp500) if bottom_sp500 else pd.DataFrame()
     if not df_sp500_down.empty:
         print(f"\nBottom S&P500 Stock Picks (Downward) as of {test_date}:")
         pd.set_option('display.max_colwidth', None)
         print(df_sp500_down)    
 
+    frames = {}
     if not df_sp500.empty:
-      append_df_to_excel(df_sp500, "Top SP500 Stocks", excel_path)
+      frames["Top SP500 Stocks"] = df_sp500
     if not df_sp500_down.empty:
-      append_df_to_excel(df_sp500_down, "Bottom SP500 Stocks", excel_path)
+      frames["Bottom SP500 Stocks"] = df_sp500_down
+    if frames:
+      append_frames_to_excel(frames, excel_path)
     print(f"All stock pick data appended to Excel: {excel_path}")
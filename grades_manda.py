@@ -2,16 +2,21 @@ import os
 import requests
 import pandas as pd
 from datetime import datetime, timedelta, date
+from requests.adapters import HTTPAdapter
 
 API_KEY = os.environ.get("FMP_API_KEY")
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
 CHAT_ID = os.environ.get("CHAT_ID")
 
+# Keep-alive session shared by every FMP and Telegram call in this script
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
 def get_json(url, params=None):
     if params is None:
         params = {}
     params['apikey'] = {API_KEY} # Use the API key directly
-    r = requests.get(url, params=params)
+    r = SESSION.get(url, params=params, timeout=10)
     if r.status_code == 200:
         return r.json()
     else:
@@ -27,6 +32,7 @@ def fetch_sp500_symbols(top_n=100):
 
 def get_upgraded_downgraded_symbols(symbols, api_key, debug=False, test_date=None):
     base_url = "https://financialmodelingprep.com/stable/grades"
+    params_template = {"apikey": API_KEY}
 
     today = datetime.today().date()
 
@@ -49,8 +55,7 @@ def get_upgraded_downgraded_symbols(symbols, api_key, debug=False, test_date=Non
 
     for symbol in symbols:
         try:
-            url = f"{base_url}?symbol={symbol}&apikey={API_KEY}"
-            response = requests.get(url)
+            response = SESSION.get(base_url, params={**params_template, "symbol": symbol}, timeout=10)
             response.raise_for_status()
             data = response.json()
 
@@ -92,12 +97,12 @@ def get_top_grade_changes(symbols, api_key, top_n=3, debug=False):
         pd.DataFrame: Combined DataFrame of all symbols with top N grade changes.
     """
     base_url = "https://financialmodelingprep.com/stable/grades"
+    params_template = {"apikey": API_KEY}
     all_records = []
 
     for symbol in symbols:
         try:
-            url = f"{base_url}?symbol={symbol}&apikey={API_KEY}"
-            response = requests.get(url)
+            response = SESSION.get(base_url, params={**params_template, "symbol": symbol}, timeout=10)
             response.raise_for_status()
             data = response.json()
 
@@ -121,11 +126,11 @@ def get_top_grade_changes(symbols, api_key, top_n=3, debug=False):
 
 def fetch_today_ma_all(api_key, debug=False, test_date=None):
     today = test_date or date.today()
+    url = "https://financialmodelingprep.com/stable/mergers-acquisitions-latest"
     results = []
     page = 0
     while True:
-        url = f"https://financialmodelingprep.com/stable/mergers-acquisitions-latest?page={page}&limit=1000&apikey={API_KEY}"
-        response = requests.get(url)
+        response = SESSION.get(url, params={"page": page, "limit": 1000, "apikey": API_KEY}, timeout=10)
         if response.status_code != 200:
             raise Exception(f"Error fetching M&A API: {response.status_code}")
 
@@ -148,15 +153,14 @@ def fetch_today_ma_all(api_key, debug=False, test_date=None):
 
 def df_to_telegram_message(df):
     message = "*Today's M&A Updates:*\n\n"
-    
-    # Loop through each row
-    for _, row in df.iterrows():
-        # First line: Symbol, Target, Date
-        message += f"*{row['symbol']} → {row['targetedSymbol']}* | {row['acceptedDate']}\n"
-        # Second line: clickable link
-        message += f"[View Filing]({row['link']})\n\n"  # extra newline for spacing
-    
-    return message
+
+    # First line: Symbol, Target, Date; second line: clickable link; extra newline for spacing
+    entries = (
+        "*" + df["symbol"].map(str) + " → " + df["targetedSymbol"].map(str)
+        + "* | " + df["acceptedDate"].map(str) + "\n"
+        + "[View Filing](" + df["link"].map(str) + ")\n\n"
+    )
+    return message + entries.str.cat()
 
 def send_updates(test_date=None):
     api_key = {API_KEY} 
@@ -168,7 +172,7 @@ def send_updates(test_date=None):
     # 2️⃣ NYSE symbols
     url = "https://financialmodelingprep.com/stable/company-screener"
     params = {"exchange": "NYSE","limit": 10000,"apikey": api_key}
-    response = requests.get(url, params=params)
+    response = SESSION.get(url, params=params, timeout=10)
     if response.status_code == 200:
         data = response.json()
         nyse_stocks = [c["symbol"] for c in data]
@@ -182,11 +186,14 @@ def send_updates(test_date=None):
         df_grades = get_top_grade_changes(matches, api_key, top_n=3)
         if not df_grades.empty:
             header = "`{:<6} {:<10} {:<12} {:<6}`".format("Symbol","Date","Company","Action")
-            rows = ["`{:<6} {:<10} {:<12} {:<6}`".format(r.symbol,r.date,r.gradingCompany[:12],r.action[:6]) for r in df_grades.itertuples(index=False)]
+            rows = ("`" + df_grades["symbol"].map("{:<6}".format)
+                    + " " + df_grades["date"].map("{:<10}".format)
+                    + " " + df_grades["gradingCompany"].str.slice(0, 12).str.ljust(12)
+                    + " " + df_grades["action"].str.slice(0, 6).str.ljust(6) + "`").tolist()
             message = "*Today's Stock Grading Updates:*\n\n" + "\n".join([header]+rows)
             url_telegram = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
             payload = {"chat_id": CHAT_ID, "text": message, "parse_mode": "Markdown"}
-            resp = requests.post(url_telegram, data=payload)
+            resp = SESSION.post(url_telegram, data=payload, timeout=10)
             if resp.status_code == 200:
                 print("Grades message sent successfully!")
             else:
@@ -200,7 +207,7 @@ def send_updates(test_date=None):
         telegram_message = df_to_telegram_message(df_ma)
         url_telegram = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
         payload = {"chat_id": CHAT_ID, "text": telegram_message, "parse_mode": "Markdown"}
-        resp = requests.post(url_telegram, data=payload)
+        resp = SESSION.post(url_telegram, data=payload, timeout=10)
         if resp.status_code == 200:
             print("M&A message sent successfully!")
         else: